@@ -1,20 +1,24 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List
-import uvicorn
+from typing_extensions import TypedDict
 import os
 import asyncio
 from datetime import datetime
 import logging
 import google.generativeai as genai
+from google import genai as google_genai
+import httpx
 from dotenv import load_dotenv
-import base64
 import io
-import json
-import re
-import random
-from PIL import Image as PILImage
+import orjson
+import time
+import hashlib
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 
 # Load environment variables
 load_dotenv()
@@ -25,8 +29,139 @@ logger = logging.getLogger(__name__)
 
 # Initialize Gemini AI
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+GEMINI_MODEL_NAME = 'gemini-2.0-flash-exp'
+
+# Structured output schema so Gemini returns bare JSON instead of prose
+class GeminiAnalysis(TypedDict):
+    risk_level: str
+    description: str
+    recommendations: List[str]
+    elevation: float
+    distance_from_water: float
+    analysis: str
+
+class IndexedGeminiAnalysis(GeminiAnalysis):
+    index: int
+
+GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": GeminiAnalysis}
+BATCH_GENERATION_CONFIG = {"response_mime_type": "application/json", "response_schema": list[IndexedGeminiAnalysis]}
+
+# Uploads are downscaled before being sent to Gemini
+MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", 1024))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", 85))
+IMAGE_REQUEST_TIMEOUT = float(os.getenv("IMAGE_REQUEST_TIMEOUT", 30))
+
+# Shared model instance, created lazily so a missing API key doesn't break startup
+GEMINI_MODEL: Optional[genai.GenerativeModel] = None
+gemini_model_lock = asyncio.Lock()
+
+async def get_gemini_model() -> genai.GenerativeModel:
+    """Return the shared Gemini model, creating it on first use"""
+    global GEMINI_MODEL
+    if GEMINI_MODEL is None:
+        async with gemini_model_lock:
+            if GEMINI_MODEL is None:
+                if not os.getenv("GEMINI_API_KEY"):
+                    raise RuntimeError("GEMINI_API_KEY is not configured")
+                GEMINI_MODEL = genai.GenerativeModel(GEMINI_MODEL_NAME, generation_config=GENERATION_CONFIG)
+    return GEMINI_MODEL
+
+# Shared google-genai client for the Batch API, so its HTTP connections are pooled per process.
+# The google-generativeai model above already reuses one cached gRPC channel.
+GEMINI_HTTP_LIMITS = httpx.Limits(max_connections=64, max_keepalive_connections=32)
+gemini_client: Optional[google_genai.Client] = None
+
+def get_gemini_client() -> google_genai.Client:
+    """Return the shared google-genai client, creating it on first use"""
+    global gemini_client
+    if gemini_client is None:
+        gemini_client = google_genai.Client(
+            api_key=os.getenv("GEMINI_API_KEY"),
+            http_options={"async_client_args": {"limits": GEMINI_HTTP_LIMITS}}
+        )
+    return gemini_client
+
+# Client-side rate limiting so bursts queue locally instead of hitting Gemini 429s
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", 60))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", 8))
+
+class TokenBucket:
+    """Async token bucket refilled continuously at a per-minute rate, with a burst of one"""
+
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60
+        # Holding a single token paces calls evenly, so no 60s window can exceed the quota;
+        # it is also the lower bound that lets a worker with a share below 1/min make progress
+        self.capacity = 1.0
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+# Created per worker on startup, see lifespan
+gemini_rate_limiter: Optional[TokenBucket] = None
+gemini_semaphore: Optional[asyncio.Semaphore] = None
+
+@asynccontextmanager
+async def gemini_slot():
+    """Hold a concurrency slot and a rate-limit token for one Gemini call"""
+    async with gemini_semaphore:
+        await gemini_rate_limiter.acquire()
+        yield
+
+async def generate_in_slot(model: genai.GenerativeModel, contents, **kwargs):
+    """Run one generate_content_async call inside a gemini_slot()"""
+    async with gemini_slot():
+        return await model.generate_content_async(contents, **kwargs)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Set up per-worker Gemini state and the coordinate batcher, then tear the batcher down"""
+    global gemini_rate_limiter, gemini_semaphore, coordinate_queue, coordinate_batcher_task
+    # Quotas are split across uvicorn workers
+    workers = max(int(os.getenv("WEB_CONCURRENCY", 1)), 1)
+    gemini_rate_limiter = TokenBucket(GEMINI_REQUESTS_PER_MINUTE / workers)
+    gemini_semaphore = asyncio.Semaphore(max(GEMINI_MAX_CONCURRENCY // workers, 1))
+    if workers > GEMINI_MAX_CONCURRENCY:
+        logger.warning(f"{workers} workers each get one Gemini slot, exceeding GEMINI_MAX_CONCURRENCY={GEMINI_MAX_CONCURRENCY}")
+    # A queued call can wait one full refill interval for its token
+    refill_interval = 60 * workers / GEMINI_REQUESTS_PER_MINUTE
+    if refill_interval > min(COORD_REQUEST_TIMEOUT, IMAGE_REQUEST_TIMEOUT):
+        logger.warning(f"Per-worker Gemini quota allows one call every {refill_interval:.0f}s, longer than the request timeouts; queued calls will time out")
+    if os.getenv("GEMINI_API_KEY"):
+        await get_gemini_model()
+    
+    coordinate_queue = asyncio.Queue()
+    coordinate_batcher_task = asyncio.create_task(run_coordinate_batcher())
+    
+    yield
+    
+    tasks = [coordinate_batcher_task, *pending_batches]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered with orjson"""
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
 
 app = FastAPI(
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
     title="Flood Detection API",
     description="Advanced flood risk assessment using Gemini AI",
     version="2.0.0",
@@ -34,15 +169,22 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
-# CORS middleware
+# CORS middleware, comma-separated origins from CORS_ALLOWED_ORIGINS ("*" allows any origin)
+CORS_ALLOWED_ORIGINS = [
+    origin.strip() for origin in os.getenv("CORS_ALLOWED_ORIGINS", "*").split(",") if origin.strip()
+]
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
+    allow_origins=CORS_ALLOWED_ORIGINS,
+    # With "*" plus credentials Starlette would reflect any Origin as trusted; the API uses no cookies or auth
+    allow_credentials="*" not in CORS_ALLOWED_ORIGINS,
+    allow_methods=["GET", "POST"],
     allow_headers=["*"],
 )
 
+# Compress the verbose analysis text in JSON responses (Starlette >= 0.46 leaves text/event-stream uncompressed)
+app.add_middleware(GZipMiddleware, minimum_size=512)
+
 # Pydantic models
 class CoordinateRequest(BaseModel):
     latitude: float = Field(..., ge=-90, le=90, description="Latitude between -90 and 90")
@@ -58,32 +200,20 @@ class AnalysisResponse(BaseModel):
     ai_analysis: Optional[str] = None
     message: str
 
-def parse_gemini_response(response_text: str) -> dict:
-    """Parse Gemini AI response and extract structured data"""
-    try:
-        json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-        if json_match:
-            json_str = json_match.group()
-            parsed_data = json.loads(json_str)
-            return {
-                "risk_level": parsed_data.get("risk_level", "Medium"),
-                "description": parsed_data.get("description", "Analysis completed"),
-                "recommendations": parsed_data.get("recommendations", []),
-                "elevation": parsed_data.get("elevation", 50.0),
-                "distance_from_water": parsed_data.get("distance_from_water", 1000.0),
-                "analysis": parsed_data.get("analysis", response_text)
-            }
-        return {
-            "risk_level": "Medium",
-            "description": "Analysis completed",
-            "recommendations": ["Monitor weather conditions", "Stay informed about local alerts"],
-            "elevation": 50.0,
-            "distance_from_water": 1000.0,
-            "analysis": response_text
-        }
-    except Exception as e:
-        logger.error(f"Error parsing Gemini response: {str(e)}")
-        return generate_fallback_response()
+ANALYSIS_DEFAULTS = {
+    "risk_level": "Medium",
+    "description": "Analysis completed",
+    "recommendations": [],
+    "elevation": 50.0,
+    "distance_from_water": 1000.0
+}
+
+def load_gemini_analysis(response_text: str) -> dict:
+    """Decode Gemini AI structured-output JSON into analysis data, raising ValueError if it isn't an object"""
+    parsed_data = orjson.loads(response_text)
+    if not isinstance(parsed_data, dict):
+        raise ValueError(f"Expected a JSON object, got {type(parsed_data).__name__}")
+    return {**ANALYSIS_DEFAULTS, "analysis": response_text, **parsed_data}
 
 def generate_fallback_response() -> dict:
     """Generate fallback response when analysis fails"""
@@ -100,6 +230,215 @@ def generate_fallback_response() -> dict:
         "analysis": "Default analysis provided"
     }
 
+# Analysis caching
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", 86400))
+COORD_CACHE_SIZE = int(os.getenv("COORD_CACHE_SIZE", 4096))
+COORD_CACHE_PRECISION = int(os.getenv("COORD_CACHE_PRECISION", 2))
+IMAGE_CACHE_SIZE = int(os.getenv("IMAGE_CACHE_SIZE", 1024))
+
+class LRUCache:
+    """Small in-process LRU cache with a fixed time-to-live per entry"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+coordinate_cache = LRUCache(COORD_CACHE_SIZE, CACHE_TTL_SECONDS)
+coordinate_inflight: dict = {}
+image_cache = LRUCache(IMAGE_CACHE_SIZE, CACHE_TTL_SECONDS)
+
+def quantize_coordinates(lat: float, lng: float) -> tuple:
+    """Snap coordinates to a ~1km grid so nearby queries share a cache entry"""
+    return round(lat, COORD_CACHE_PRECISION), round(lng, COORD_CACHE_PRECISION)
+
+async def analyze_coordinates_cached(lat: float, lng: float) -> dict:
+    """Return the cached analysis for the grid cell, or analyze and cache it"""
+    key = quantize_coordinates(lat, lng)
+    parsed_data = coordinate_cache.get(key)
+    if parsed_data is not None:
+        logger.info(f"Coordinate cache hit for {key} (hits={coordinate_cache.hits}, misses={coordinate_cache.misses})")
+        return parsed_data
+    
+    # Single-flight: identical concurrent queries share the first caller's Gemini request
+    inflight = coordinate_inflight.get(key)
+    if inflight is not None:
+        logger.info(f"Joining in-flight coordinate analysis for {key}")
+        return await asyncio.shield(inflight)
+    
+    future = asyncio.get_running_loop().create_future()
+    coordinate_inflight[key] = future
+    try:
+        parsed_data = await analyze_coordinates_batched(lat, lng)
+        coordinate_cache.set(key, parsed_data)
+        future.set_result(parsed_data)
+        return parsed_data
+    except BaseException as e:
+        error = e if isinstance(e, Exception) else RuntimeError("Coordinate analysis was cancelled")
+        future.set_exception(error)
+        # Mark the exception as retrieved in case nobody joined this flight
+        future.exception()
+        raise
+    finally:
+        coordinate_inflight.pop(key, None)
+
+# Coordinate micro-batching
+COORD_BATCH_SIZE = int(os.getenv("COORD_BATCH_SIZE", 8))
+COORD_BATCH_WAIT_MS = int(os.getenv("COORD_BATCH_WAIT_MS", 25))
+COORD_REQUEST_TIMEOUT = float(os.getenv("COORD_REQUEST_TIMEOUT", 30))
+
+coordinate_queue: Optional[asyncio.Queue] = None
+coordinate_batcher_task: Optional[asyncio.Task] = None
+pending_batches: set = set()
+
+def build_coordinate_prompt(lat: float, lng: float) -> str:
+    """Build the Gemini prompt for a single location"""
+    return f"""
+        Analyze flood risk for location at latitude {lat}, longitude {lng}.
+        
+        Provide detailed assessment including:
+        1. Risk Level (Low/Medium/High/Very High)
+        2. Description of risk factors
+        3. 3-5 specific recommendations
+        4. Estimated elevation in meters
+        5. Estimated distance from nearest water body in meters
+        6. Detailed analysis of terrain and flood risk factors
+        
+        Format response as JSON with these fields:
+        - risk_level
+        - description
+        - recommendations (array)
+        - elevation (number)
+        - distance_from_water (number)
+        - analysis (detailed text)
+        """
+
+def build_batch_coordinate_prompt(batch: list) -> str:
+    """Build one Gemini prompt covering several locations"""
+    locations = "\n".join(
+        f"        {index}. latitude {lat}, longitude {lng}"
+        for index, (lat, lng, _) in enumerate(batch)
+    )
+    return f"""
+        Analyze flood risk for each of the following locations:
+{locations}
+        
+        For every location provide detailed assessment including:
+        1. Risk Level (Low/Medium/High/Very High)
+        2. Description of risk factors
+        3. 3-5 specific recommendations
+        4. Estimated elevation in meters
+        5. Estimated distance from nearest water body in meters
+        6. Detailed analysis of terrain and flood risk factors
+        
+        Format response as a JSON array with one object per location, each with these fields:
+        - index (the location number above)
+        - risk_level
+        - description
+        - recommendations (array)
+        - elevation (number)
+        - distance_from_water (number)
+        - analysis (detailed text)
+        """
+
+def parse_batch_response(response_text: str, size: int) -> List[Optional[dict]]:
+    """Parse a multi-location Gemini response into per-location results"""
+    results: List[Optional[dict]] = [None] * size
+    for position, item in enumerate(orjson.loads(response_text)):
+        if not isinstance(item, dict):
+            continue
+        index = item.get("index", position)
+        if isinstance(index, int) and 0 <= index < size:
+            results[index] = {**ANALYSIS_DEFAULTS, "analysis": "", **item}
+    return results
+
+async def process_coordinate_batch(batch: list):
+    """Send one Gemini request for a batch and resolve each caller's future"""
+    try:
+        model = await get_gemini_model()
+        if len(batch) == 1:
+            lat, lng, _ = batch[0]
+            async with gemini_slot():
+                response = await model.generate_content_async(build_coordinate_prompt(lat, lng))
+            results = [load_gemini_analysis(response.text)]
+        else:
+            async with gemini_slot():
+                response = await model.generate_content_async(
+                    build_batch_coordinate_prompt(batch),
+                    generation_config=BATCH_GENERATION_CONFIG
+                )
+            results = parse_batch_response(response.text, len(batch))
+    except Exception as e:
+        logger.error(f"Gemini batch error ({len(batch)} locations): {str(e)}")
+        for _, _, future in batch:
+            if not future.done():
+                future.set_exception(e)
+        return
+
+    for (lat, lng, future), result in zip(batch, results):
+        if future.done():
+            continue
+        if result is None:
+            future.set_exception(ValueError(f"No batch result for coordinates {lat}, {lng}"))
+        else:
+            future.set_result(result)
+
+async def run_coordinate_batcher():
+    """Drain the coordinate queue into batches of up to COORD_BATCH_SIZE"""
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = [await coordinate_queue.get()]
+        deadline = loop.time() + COORD_BATCH_WAIT_MS / 1000
+        while len(batch) < COORD_BATCH_SIZE:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(coordinate_queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        task = asyncio.create_task(process_coordinate_batch(batch))
+        pending_batches.add(task)
+        task.add_done_callback(pending_batches.discard)
+
+async def analyze_coordinates_batched(lat: float, lng: float) -> dict:
+    """Queue a location for the micro-batcher and wait for its parsed result"""
+    future = asyncio.get_running_loop().create_future()
+    await coordinate_queue.put((lat, lng, future))
+    return await asyncio.wait_for(future, timeout=COORD_REQUEST_TIMEOUT)
+
+# ISO timestamp reused for up to a second, so frequent health probes skip the formatting
+_last_timestamp_at = 0.0
+_last_timestamp = ""
+
+def current_timestamp() -> str:
+    """Return the current local time in ISO format, refreshed at most once per second"""
+    global _last_timestamp_at, _last_timestamp
+    now = time.monotonic()
+    if not _last_timestamp or now - _last_timestamp_at >= 1:
+        _last_timestamp_at = now
+        _last_timestamp = datetime.now().isoformat()
+    return _last_timestamp
+
 @app.get("/")
 async def root():
     """Root endpoint with API information"""
@@ -107,11 +446,14 @@ async def root():
         "message": "Flood Detection API with Gemini AI",
         "version": "2.0.0",
         "status": "healthy",
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": current_timestamp(),
         "endpoints": {
             "health_check": "/health",
             "image_analysis": "/api/analyze/image",
             "coordinate_analysis": "/api/analyze/coordinates",
+            "streaming_coordinate_analysis": "/api/analyze/coordinates/stream",
+            "batch_coordinate_analysis": "/api/analyze/coordinates/batch",
+            "batch_status": "/api/batch/{job_id}",
             "documentation": "/docs"
         }
     }
@@ -122,7 +464,7 @@ async def health_check():
     return {
         "status": "healthy",
         "ai_model": "Gemini 2.0 Flash",
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": current_timestamp(),
         "environment": os.getenv("ENVIRONMENT", "development")
     }
 
@@ -140,30 +482,8 @@ async def analyze_coordinates(coords: CoordinateRequest):
     try:
         logger.info(f"Analyzing coordinates: {coords.latitude}, {coords.longitude}")
         
-        prompt = f"""
-        Analyze flood risk for location at latitude {coords.latitude}, longitude {coords.longitude}.
-        
-        Provide detailed assessment including:
-        1. Risk Level (Low/Medium/High/Very High)
-        2. Description of risk factors
-        3. 3-5 specific recommendations
-        4. Estimated elevation in meters
-        5. Estimated distance from nearest water body in meters
-        6. Detailed analysis of terrain and flood risk factors
-        
-        Format response as JSON with these fields:
-        - risk_level
-        - description
-        - recommendations (array)
-        - elevation (number)
-        - distance_from_water (number)
-        - analysis (detailed text)
-        """
-        
         try:
-            model = genai.GenerativeModel('gemini-2.0-flash-exp')
-            response = model.generate_content(prompt)
-            parsed_data = parse_gemini_response(response.text)
+            parsed_data = await analyze_coordinates_cached(coords.latitude, coords.longitude)
             
             return {
                 "success": True,
@@ -189,13 +509,136 @@ async def analyze_coordinates(coords: CoordinateRequest):
         logger.error(f"Coordinate analysis error: {str(e)}")
         raise HTTPException(status_code=500, detail="Internal server error during analysis")
 
+@app.post("/api/analyze/coordinates/stream")
+async def analyze_coordinates_stream(coords: CoordinateRequest):
+    """
+    Stream a coordinate analysis as Server-Sent Events
+    
+    Each event carries the next chunk of Gemini's JSON output as it is
+    generated, followed by a final "done" event. If Gemini fails, a
+    "fallback" event with simulated data is sent instead.
+    """
+    logger.info(f"Streaming analysis for coordinates: {coords.latitude}, {coords.longitude}")
+    
+    async def event_stream():
+        try:
+            model = await get_gemini_model()
+            # Only opening the stream needs a slot; slow SSE readers must not hold it
+            async with gemini_slot():
+                response = await model.generate_content_async(
+                    build_coordinate_prompt(coords.latitude, coords.longitude),
+                    stream=True
+                )
+            async for chunk in response:
+                if chunk.parts:
+                    yield format_sse_event(chunk.text)
+        except Exception as ai_error:
+            logger.error(f"Gemini AI streaming error: {str(ai_error)}")
+            fallback = generate_coordinate_fallback(coords.latitude, coords.longitude)
+            yield format_sse_event(orjson.dumps(fallback).decode(), event="fallback")
+        yield format_sse_event("", event="done")
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/api/analyze/coordinates/batch")
+async def analyze_coordinates_batch(locations: List[CoordinateRequest]):
+    """
+    Submit coordinate analyses to the Gemini Batch API
+    
+    Batch jobs are billed at half price but complete asynchronously;
+    poll /api/batch/{job_id} for the results.
+    
+    Parameters:
+    - list of {latitude, longitude} objects
+    
+    Returns the batch job id
+    """
+    if not locations:
+        raise HTTPException(status_code=400, detail="At least one location is required")
+    
+    try:
+        logger.info(f"Submitting batch analysis for {len(locations)} locations")
+        
+        lines = [
+            orjson.dumps({
+                "key": str(index),
+                "request": {
+                    "contents": [{
+                        "role": "user",
+                        "parts": [{"text": build_coordinate_prompt(loc.latitude, loc.longitude)}]
+                    }],
+                    "generation_config": {"response_mime_type": "application/json"}
+                }
+            })
+            for index, loc in enumerate(locations)
+        ]
+        
+        client = get_gemini_client()
+        uploaded = await client.aio.files.upload(
+            file=io.BytesIO(b"\n".join(lines)),
+            config={"display_name": "coordinate-batch", "mime_type": "jsonl"}
+        )
+        job = await client.aio.batches.create(model=GEMINI_MODEL_NAME, src=uploaded.name)
+        
+        return {
+            "success": True,
+            "job_id": job.name.removeprefix("batches/"),
+            "state": job.state.name if job.state else None,
+            "message": "Batch analysis submitted successfully"
+        }
+        
+    except Exception as e:
+        logger.error(f"Batch submission error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error during batch submission")
+
+@app.get("/api/batch/{job_id}")
+async def get_batch_results(job_id: str):
+    """
+    Check a Gemini batch job and return parsed results once it has succeeded
+    
+    Results are listed in the order the locations were submitted.
+    """
+    try:
+        client = get_gemini_client()
+        job = await client.aio.batches.get(name=f"batches/{job_id}")
+        state = job.state.name if job.state else None
+        
+        if state != "JOB_STATE_SUCCEEDED":
+            return {
+                "success": state not in ("JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"),
+                "job_id": job_id,
+                "state": state,
+                "message": "Batch analysis not completed"
+            }
+        
+        output = await client.aio.files.download(file=job.dest.file_name)
+        lines = [line for line in output.splitlines() if line.strip()]
+        results = [parse_batch_output_line(line, position) for position, line in enumerate(lines)]
+        results.sort(key=lambda result: result["index"])
+        
+        return {
+            "success": True,
+            "job_id": job_id,
+            "state": state,
+            "results": results,
+            "message": "Batch analysis completed successfully"
+        }
+        
+    except Exception as e:
+        logger.error(f"Batch retrieval error: {str(e)}")
+        raise HTTPException(status_code=500, detail="Internal server error during batch retrieval")
+
 @app.post("/api/analyze/image")
 async def analyze_image(file: UploadFile = File(...)):
     """
     Analyze flood risk from terrain image
     
     Parameters:
-    - file: Image file (JPEG, PNG) under 10MB
+    - file: Image file (JPEG, PNG, WebP) under 10MB
     
     Returns flood risk assessment with visual analysis
     """
@@ -206,63 +649,79 @@ async def analyze_image(file: UploadFile = File(...)):
         if not file.content_type.startswith("image/"):
             raise HTTPException(status_code=400, detail="Only image files are accepted")
         
-        if file.size > 10 * 1024 * 1024:
+        if file.size is not None and file.size > MAX_UPLOAD_SIZE:
             raise HTTPException(status_code=400, detail="File size exceeds 10MB limit")
         
-        # Process image
-        image_data = await file.read()
-        try:
-            image = PILImage.open(io.BytesIO(image_data))
-            if image.mode != 'RGB':
-                image = image.convert('RGB')
-        except Exception as img_error:
-            logger.error(f"Image processing error: {str(img_error)}")
-            raise HTTPException(status_code=400, detail="Invalid image format")
+        # Process image, reading in chunks so oversized uploads are rejected early
+        buffer = bytearray()
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            if len(buffer) + len(chunk) > MAX_UPLOAD_SIZE:
+                raise HTTPException(status_code=400, detail="File size exceeds 10MB limit")
+            buffer.extend(chunk)
+        image_data = bytes(buffer)
+        if not has_supported_image_signature(image_data):
+            raise HTTPException(status_code=400, detail="Unsupported image type, expected JPEG, PNG or WebP")
         
-        # Generate analysis prompt
-        prompt = """
-        Analyze this terrain image for flood risk assessment.
-        Provide detailed assessment including:
-        1. Risk Level (Low/Medium/High/Very High)
-        2. Description of visible risk factors
-        3. 3-5 specific recommendations
-        4. Estimated elevation in meters
-        5. Estimated distance from visible water bodies
-        6. Detailed analysis of what you observe
+        cache_key = await asyncio.to_thread(image_cache_key, image_data)
+        parsed_data = image_cache.get(cache_key)
         
-        Format response as JSON with these fields:
-        - risk_level
-        - description
-        - recommendations (array)
-        - elevation (number)
-        - distance_from_water (number)
-        - analysis (detailed text)
-        """
-        
-        try:
-            model = genai.GenerativeModel('gemini-2.0-flash-exp')
-            response = model.generate_content([prompt, image])
-            parsed_data = parse_gemini_response(response.text)
+        if parsed_data is not None:
+            logger.info(f"Image cache hit for {cache_key} (hits={image_cache.hits}, misses={image_cache.misses})")
+        else:
+            try:
+                jpeg_data = await asyncio.to_thread(_decode_image, image_data)
+            except Exception as img_error:
+                logger.error(f"Image processing error: {str(img_error)}")
+                raise HTTPException(status_code=400, detail="Invalid image format")
             
-            return {
-                "success": True,
-                "risk_level": parsed_data["risk_level"],
-                "description": parsed_data["description"],
-                "recommendations": parsed_data["recommendations"],
-                "elevation": parsed_data["elevation"],
-                "distance_from_water": parsed_data["distance_from_water"],
-                "ai_analysis": parsed_data["analysis"],
-                "message": "Image analysis completed successfully"
-            }
+            # Generate analysis prompt
+            prompt = """
+            Analyze this terrain image for flood risk assessment.
+            Provide detailed assessment including:
+            1. Risk Level (Low/Medium/High/Very High)
+            2. Description of visible risk factors
+            3. 3-5 specific recommendations
+            4. Estimated elevation in meters
+            5. Estimated distance from visible water bodies
+            6. Detailed analysis of what you observe
             
-        except Exception as ai_error:
-            logger.error(f"Gemini AI error: {str(ai_error)}")
-            fallback = generate_image_fallback()
-            return {
-                "success": True,
-                "message": "Analysis completed with simulated data",
-                **fallback
-            }
+            Format response as JSON with these fields:
+            - risk_level
+            - description
+            - recommendations (array)
+            - elevation (number)
+            - distance_from_water (number)
+            - analysis (detailed text)
+            """
+            
+            try:
+                model = await get_gemini_model()
+                response = await asyncio.wait_for(
+                    generate_in_slot(model, [prompt, {"mime_type": "image/jpeg", "data": jpeg_data}]),
+                    timeout=IMAGE_REQUEST_TIMEOUT
+                )
+                parsed_data = load_gemini_analysis(response.text)
+                image_cache.set(cache_key, parsed_data)
+                
+            except Exception as ai_error:
+                logger.error(f"Gemini AI error: {str(ai_error)}")
+                fallback = generate_image_fallback()
+                return {
+                    "success": True,
+                    "message": "Analysis completed with simulated data",
+                    **fallback
+                }
+        
+        return {
+            "success": True,
+            "risk_level": parsed_data["risk_level"],
+            "description": parsed_data["description"],
+            "recommendations": parsed_data["recommendations"],
+            "elevation": parsed_data["elevation"],
+            "distance_from_water": parsed_data["distance_from_water"],
+            "ai_analysis": parsed_data["analysis"],
+            "message": "Image analysis completed successfully"
+        }
             
     except HTTPException:
         raise
@@ -271,6 +730,69 @@ async def analyze_image(file: UploadFile = File(...)):
         raise HTTPException(status_code=500, detail="Internal server error during analysis")
 
 # Helper functions
+def format_sse_event(data: str, event: Optional[str] = None) -> str:
+    """Format a Server-Sent Events message, prefixing every line of data"""
+    lines = [f"event: {event}"] if event else []
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+def has_supported_image_signature(image_data: bytes) -> bool:
+    """Check the leading magic bytes for JPEG, PNG or WebP before handing data to PIL"""
+    return (
+        image_data.startswith(b"\xff\xd8\xff")
+        or image_data.startswith(b"\x89PNG\r\n\x1a\n")
+        or (image_data[:4] == b"RIFF" and image_data[8:12] == b"WEBP")
+    )
+
+def image_cache_key(image_data: bytes) -> str:
+    """Content hash of an upload (hashlib releases the GIL, so this runs in a worker thread)"""
+    return hashlib.blake2b(image_data, digest_size=16).hexdigest()
+
+def _decode_image(image_data: bytes) -> bytes:
+    """Decode, downscale and re-encode an upload as JPEG (blocking, run in a worker thread)"""
+    # Imported lazily so workers that never see an upload don't load Pillow
+    from PIL import Image as PILImage
+    
+    image = PILImage.open(io.BytesIO(image_data))
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    image.thumbnail((IMAGE_MAX_EDGE, IMAGE_MAX_EDGE), PILImage.Resampling.LANCZOS)
+    
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=IMAGE_JPEG_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+def parse_batch_output_line(line: bytes, position: int) -> dict:
+    """Turn one line of a Gemini batch output file into an analysis result"""
+    entry = None
+    index = position
+    try:
+        entry = orjson.loads(line)
+        index = int(entry["key"])
+        parts = entry["response"]["candidates"][0]["content"]["parts"]
+        parsed_data = load_gemini_analysis("".join(part.get("text", "") for part in parts))
+    except (KeyError, IndexError, TypeError, AttributeError, ValueError) as e:
+        error = entry.get("error") if isinstance(entry, dict) and entry.get("error") else str(e)
+        logger.error(f"Batch entry {index} failed: {error}")
+        return {
+            "index": index,
+            "success": False,
+            "message": "Batch analysis failed for this location",
+            **generate_fallback_response()
+        }
+    
+    return {
+        "index": index,
+        "success": True,
+        "risk_level": parsed_data["risk_level"],
+        "description": parsed_data["description"],
+        "recommendations": parsed_data["recommendations"],
+        "elevation": parsed_data["elevation"],
+        "distance_from_water": parsed_data["distance_from_water"],
+        "ai_analysis": parsed_data["analysis"],
+        "message": "Coordinate analysis completed successfully"
+    }
+
 def generate_coordinate_fallback(lat: float, lng: float) -> dict:
     """Generate simulated coordinate analysis"""
     risk_level = "Medium"
@@ -308,12 +830,21 @@ def generate_image_fallback() -> dict:
     }
 
 if __name__ == "__main__":
+    import uvicorn
+    
     port = int(os.getenv("PORT", 8000))
+    # Auto-reload only works with a single worker, so keep it to development
+    reload = os.getenv("ENVIRONMENT", "development") == "development"
+    # Default to one worker per core, but no more than there are Gemini slots to share
+    default_workers = min(os.cpu_count() or 1, GEMINI_MAX_CONCURRENCY)
+    workers = 1 if reload else int(os.getenv("WEB_CONCURRENCY", default_workers))
+    os.environ["WEB_CONCURRENCY"] = str(workers)
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=port,
-        reload=True,
+        reload=reload,
+        workers=workers,
         log_level="info"
     )
     
\ No newline at end of file
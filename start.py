@@ -16,7 +16,14 @@ if __name__ == "__main__":
     port = int(os.getenv("PORT", 8000))
     host = os.getenv("HOST", "0.0.0.0")
     
-    print(f"Starting Flood Detection Backend API on {host}:{port}")
+    # Auto-reload only works with a single worker, so keep it to development
+    reload = os.getenv("ENVIRONMENT", "development") == "development"
+    # Default to one worker per core, but no more than there are Gemini slots to share
+    default_workers = min(os.cpu_count() or 1, int(os.getenv("GEMINI_MAX_CONCURRENCY", 8)))
+    workers = 1 if reload else int(os.getenv("WEB_CONCURRENCY", default_workers))
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    
+    print(f"Starting Flood Detection Backend API on {host}:{port} ({workers} worker(s))")
     print("API Documentation will be available at:")
     print(f"  - Swagger UI: http://{host}:{port}/docs")
     print(f"  - ReDoc: http://{host}:{port}/redoc")
@@ -26,6 +33,7 @@ if __name__ == "__main__":
         "main:app",
         host=host,
         port=port,
-        reload=True,
+        reload=reload,
+        workers=workers,
         log_level="info"
     ) 
\ No newline at end of file